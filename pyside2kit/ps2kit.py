@@ -6,12 +6,17 @@ Each object is built on standard PySide2 classes like QWidget.
 
 """
 
+import logging
 import os
+import struct
+import sys
+import threading
 import typing
 from functools import partial
 
 from PySide2 import QtWidgets, QtCore, QtGui
 from PySide2.QtCore import Signal, Slot
+import shiboken2
 
 ESCAPED_CHARS_DICT = {"-":  r"\-",
                       "]":  r"\]",
@@ -22,10 +27,38 @@ ESCAPED_CHARS_DICT = {"-":  r"\-",
                       ".":  r"\."}
 
 
+# Logical DPI reported by Qt when no OS scaling is applied
+BASE_LOGICAL_DPI = 72 if sys.platform == "darwin" else 96
+
+# Binary state blobs produced by save_state(): a fixed header (magic, format version) followed by the widget data
+STATE_FORMAT_VERSION = 1
+_TEXTURE_PALETTE_STATE_HEADER = struct.Struct("<4sHHiII")  # magic, version, grid_side, checked index, path lengths
+_CHECKABLE_LIST_STATE_HEADER = struct.Struct("<4sHI")  # magic, version, items count
+
+
 def escape_chars_for_css(path):
     return path.translate(str.maketrans(ESCAPED_CHARS_DICT))
 
 
+def _check_state_header(state, header, magic):
+    """
+    Unpack and validate the header of a state blob produced by a save_state() method
+    :param state: (bytes) the state blob
+    :param header: (struct.Struct) the expected header layout
+    :param magic: (bytes) the expected magic identifier
+    :return: (tuple) header fields following magic and version
+    """
+    try:
+        fields = header.unpack_from(state)
+    except struct.error:
+        raise ValueError("State blob is too short to contain a valid header")
+    if fields[0] != magic:
+        raise ValueError("State blob was not produced by this widget type")
+    if fields[1] != STATE_FORMAT_VERSION:
+        raise ValueError("Unsupported state format version: {}".format(fields[1]))
+    return fields[2:]
+
+
 # WORK IN PROGRESS: CUSTOM BUTTON WITH A GENERIC VALUE ATTIBUTE
 class QValueButton(QtWidgets.QPushButton):
     @typing.overload
@@ -128,13 +161,17 @@ class QTexturePalette(QtWidgets.QGroupBox):
         self.palette_buttons_group.setExclusive(True)
 
         self.image_filename = self.css_image_filename = ""
+        self.requested_image_filename = ""  # Image asked for, before falling back to the missing palette image
         self.set_palette_image(image_filename)
 
         # Here a size multiplier is computed for screen resolutions < 4k. Used for scale fonts and widgets
         temp_app = QtWidgets.QApplication.instance()
         if temp_app is None:
             temp_app = QtWidgets.QApplication([])  # if it does not exist then a QApplication is created
-        self.screen_factor = (2160/temp_app.primaryScreen().size().height())
+        self.palette_size = palette_size
+        self.screen_factor = self._compute_screen_factor(self.screen())
+        self._window_handle = None  # Window whose screenChanged signal is tracked, set when the palette is shown
+        self._tracked_screen = None  # Screen whose geometry/DPI signals are tracked
 
         # Initialize button labels list reading labels from a given txt file
         self.button_labels_list = []
@@ -153,7 +190,6 @@ class QTexturePalette(QtWidgets.QGroupBox):
                 temp_label = QtWidgets.QLabel("")
                 temp_label.setAlignment(QtCore.Qt.AlignCenter)
 
-                temp_label.setStyleSheet(".QLabel {color: white;font-size: "+str(round(15/self.screen_factor))+"px; border:0px; border-width: 0px}")
                 temp_layout = QtWidgets.QVBoxLayout()
                 temp_layout.setContentsMargins(1, 1, 1, 1)
                 temp_layout.addWidget(temp_label)
@@ -162,14 +198,9 @@ class QTexturePalette(QtWidgets.QGroupBox):
                 temp_btn = QtWidgets.QPushButton("")
 
                 temp_btn.setToolTip(buttons_tooltip)
-                temp_btn.setMinimumSize(round(palette_size // grid_side / self.screen_factor), round(palette_size // grid_side / self.screen_factor))
                 temp_btn.setFlat(True)
                 temp_btn.setCheckable(True)
                 temp_btn.autoRaise = False
-                temp_btn.setStyleSheet(".QPushButton{background-color: transparent;padding: 0px}"
-                                       ".QPushButton:hover{background-color: transparent;border-style: inset;border-width: 2px;border-color: blue;}"
-                                       ".QPushButton:pressed{background-color: white;border-style: inset;border-width: 3px;border-color: grey;}"
-                                       ".QPushButton:checked{background-color: transparent;border-style: inset;border-width: 10px;border-color: white;}")
                 temp_btn.setSizePolicy(QtWidgets.QSizePolicy().Expanding, QtWidgets.QSizePolicy().Expanding)
                 self.palette_buttons.append((temp_btn, button_value))
                 temp_btn.setLayout(temp_layout)
@@ -177,12 +208,16 @@ class QTexturePalette(QtWidgets.QGroupBox):
                 temp_btn.clicked.connect(partial(self.press_button, button_value, len(self.palette_buttons)-1))
                 self.palette_buttons_group.addButton(temp_btn)
 
+        # Cells' style and labels' font are shared: set once on the frame instead of on every cell
+        self._update_palette_frame_style()
+        self._apply_screen_factor()
+
         """if button_labels_filename:
             if not os.path.exists(button_labels_filename):
                 button_labels_filename = os.path.join(os.path.dirname(__file__), "resources", "missing_palette_labels.txt")
             self.button_labels_filename = button_labels_filename
             self.set_button_labels(button_labels_filename)"""
-        self.button_labels_filename = button_labels_filename
+        self.button_labels_filename = ""  # Last labels file applied, updated by set_button_labels()
         self.set_button_labels(button_labels_filename)
 
         # self.palette_frame.setStyleSheet(".QFrame{border-image: url( " + self.css_image_filename + ") 0 0 0 0 stretch stretch;}")
@@ -228,18 +263,109 @@ class QTexturePalette(QtWidgets.QGroupBox):
         :param forward_signal: boolean telling if we need to emit another signal or not
         """
         if image_filename:
+            self.requested_image_filename = image_filename
             if not os.path.exists(image_filename):
                 image_filename = os.path.join(os.path.dirname(__file__), "resources", "missing_palette.png")
             # self.image_browser_dialog.set_browsed_path(image_filename)
             image_filename = image_filename.replace("\\", "/")  # Needed because path ends in a stylesheet
             self.image_filename = image_filename
             self.css_image_filename = escape_chars_for_css(image_filename)
-            self.palette_frame.setStyleSheet(
-                ".QFrame{border-image: url( " + self.css_image_filename + ") 0 0 0 0 stretch stretch;}")
+            self._update_palette_frame_style()
             if forward_signal:
                 print("signal")
                 self.image_updated.emit(image_filename)
 
+    def _update_palette_frame_style(self):
+        """
+        Set the single stylesheet shared by the palette frame and all its cells (buttons and labels)
+        """
+        frame_style = ""
+        if self.css_image_filename:
+            frame_style = ".QFrame{border-image: url( " + self.css_image_filename + ") 0 0 0 0 stretch stretch;}"
+        self.palette_frame.setStyleSheet(
+            frame_style +
+            ".QLabel{color: white; border:0px; border-width: 0px}"
+            ".QPushButton{background-color: transparent;padding: 0px}"
+            ".QPushButton:hover{background-color: transparent;border-style: inset;border-width: 2px;border-color: blue;}"
+            ".QPushButton:pressed{background-color: white;border-style: inset;border-width: 3px;border-color: grey;}"
+            ".QPushButton:checked{background-color: transparent;border-style: inset;border-width: 10px;border-color: white;}")
+
+    @staticmethod
+    def _compute_screen_factor(screen):
+        """
+        Compute the size multiplier for a screen (resolutions < 4k get a factor > 1).
+        The OS scaling is taken into account both as device pixel ratio (Qt high DPI scaling enabled)
+        and as logical DPI compared to the platform base DPI (Qt high DPI scaling disabled):
+        a 4k screen with no scaling gets 1.0
+        :param screen: (QScreen) the screen the palette is shown on
+        """
+        physical_height = screen.size().height() * screen.devicePixelRatio()
+        return 2160 * BASE_LOGICAL_DPI / (physical_height * screen.logicalDotsPerInch())
+
+    def _apply_screen_factor(self):
+        """
+        Scale palette minimum size and labels' font using the current screen_factor.
+        Both are set on the palette frame only: cells expand to fill it and inherit its font.
+        Qt still propagates the font change to every cell, but no per-cell stylesheet has to be parsed.
+        """
+        frame_side = round(self.palette_size // self.grid_side / self.screen_factor) * self.grid_side
+        self.palette_frame.setMinimumSize(frame_side, frame_side)
+        labels_font = QtGui.QFont(self.palette_frame.font())
+        labels_font.setPixelSize(max(1, round(15 / self.screen_factor)))
+        self.palette_frame.setFont(labels_font)
+
+    @Slot()
+    def rescale(self):
+        """
+        Recompute screen_factor for the screen the palette is shown on and rescale it in one pass, with updates suspended
+        """
+        screen_factor = self._compute_screen_factor(self.screen())
+        if screen_factor == self.screen_factor:
+            return
+        self.screen_factor = screen_factor
+        self.setUpdatesEnabled(False)
+        try:
+            self._apply_screen_factor()
+        finally:
+            self.setUpdatesEnabled(True)
+
+    @Slot(QtGui.QScreen)
+    def _track_screen(self, screen):
+        """
+        Follow resolution and DPI changes of the screen the palette is shown on, then rescale
+        :param screen: (QScreen) the new screen
+        """
+        if screen is not self._tracked_screen:
+            if self._tracked_screen is not None:
+                try:
+                    self._tracked_screen.geometryChanged.disconnect(self.rescale)
+                    self._tracked_screen.logicalDotsPerInchChanged.disconnect(self.rescale)
+                    self._tracked_screen.physicalDotsPerInchChanged.disconnect(self.rescale)
+                except (RuntimeError, TypeError):  # Screen already removed
+                    pass
+            self._tracked_screen = screen
+            if screen is not None:
+                screen.geometryChanged.connect(self.rescale)
+                screen.logicalDotsPerInchChanged.connect(self.rescale)
+                screen.physicalDotsPerInchChanged.connect(self.rescale)
+        self.rescale()
+
+    def showEvent(self, event):
+        """
+        Start tracking the screen of the window holding the palette (a native window exists only once shown)
+        """
+        super(QTexturePalette, self).showEvent(event)
+        window_handle = self.window().windowHandle()
+        if window_handle is not None and window_handle is not self._window_handle:
+            if self._window_handle is not None:
+                try:
+                    self._window_handle.screenChanged.disconnect(self._track_screen)
+                except (RuntimeError, TypeError):  # Previous window already destroyed
+                    pass
+            self._window_handle = window_handle
+            window_handle.screenChanged.connect(self._track_screen)
+        self._track_screen(self.screen())
+
     def _read_button_labels_from_file(self, button_labels_filename):
         """
         Update the buttons' labels
@@ -258,6 +384,8 @@ class QTexturePalette(QtWidgets.QGroupBox):
         Update the buttons' labels
         :param button_labels_filename:
         """
+        if button_labels_filename:
+            self.button_labels_filename = button_labels_filename
         self._read_button_labels_from_file(button_labels_filename)
         for i in range(self.grid_side):
             for j in range(self.grid_side):
@@ -267,6 +395,64 @@ class QTexturePalette(QtWidgets.QGroupBox):
                 except LookupError:
                     pass
 
+    def save_state(self):
+        """
+        Serialize palette image, labels file and checked button into a compact binary blob
+        :return: (bytes) state to be passed to restore_state()
+        """
+        checked_button = self.palette_buttons_group.checkedButton()
+        checked_index = -1
+        if checked_button is not None:
+            checked_index = [button for button, value in self.palette_buttons].index(checked_button)
+        image_filename = self.requested_image_filename.encode("utf-8")
+        button_labels_filename = self.button_labels_filename.encode("utf-8")
+        return (_TEXTURE_PALETTE_STATE_HEADER.pack(b"PSTP", STATE_FORMAT_VERSION, self.grid_side, checked_index,
+                                                   len(image_filename), len(button_labels_filename))
+                + image_filename + button_labels_filename)
+
+    def restore_state(self, state):
+        """
+        Restore a state produced by save_state() in a single pass, with widget updates suspended
+        :param state: (bytes) the state blob
+        """
+        grid_side, checked_index, image_length, labels_length = _check_state_header(
+            state, _TEXTURE_PALETTE_STATE_HEADER, b"PSTP")
+        if grid_side != self.grid_side:
+            raise ValueError("State grid side ({}) does not match palette grid side ({})".format(grid_side, self.grid_side))
+        if not -1 <= checked_index < len(self.palette_buttons):
+            raise ValueError("State checked button index ({}) is out of range".format(checked_index))
+        offset = _TEXTURE_PALETTE_STATE_HEADER.size
+        if len(state) < offset + image_length + labels_length:
+            raise ValueError("State blob is truncated")
+        image_filename = bytes(state[offset:offset + image_length]).decode("utf-8")
+        offset += image_length
+        button_labels_filename = bytes(state[offset:offset + labels_length]).decode("utf-8")
+
+        self.setUpdatesEnabled(False)
+        try:
+            if image_filename:
+                self.set_palette_image(image_filename)
+            else:
+                self.image_filename = self.css_image_filename = self.requested_image_filename = ""
+                self._update_palette_frame_style()
+            if not button_labels_filename:
+                self.button_labels_filename = ""
+                self.button_labels_list = []
+            self.set_button_labels(button_labels_filename)
+            if checked_index >= 0:
+                self._check_button(checked_index)
+            elif self.palette_buttons_group.checkedButton() is not None:
+                # An exclusive group doesn't allow to uncheck its checked button
+                self.palette_buttons_group.setExclusive(False)
+                self.palette_buttons_group.checkedButton().setChecked(False)
+                self.palette_buttons_group.setExclusive(True)
+            if getattr(self, "image_browser_dialog", None) is not None:
+                self.image_browser_dialog._path_line_edit.setText(image_filename)
+            if getattr(self, "labels_browser_dialog", None) is not None:
+                self.labels_browser_dialog._path_line_edit.setText(button_labels_filename)
+        finally:
+            self.setUpdatesEnabled(True)
+
 
 class QCheckableList(QtWidgets.QWidget):
     """
@@ -304,11 +490,30 @@ class QCheckableList(QtWidgets.QWidget):
         tree.setHeaderHidden(True)
         group_layout.addWidget(tree)
 
-        for i in self.items:
+        self._populate_tree(self.items)
+
+    def _populate_tree(self, texts, checked_flags=None):
+        """
+        Replace all the tree items in a single bulk insertion, with tree updates suspended
+        :param texts: iterable of the texts to be listed
+        :param checked_flags: optional sequence of booleans telling which items are checked
+        """
+        items = []
+        for index, text in enumerate(texts):
             item = QtWidgets.QTreeWidgetItem()
-            item.setText(0, i)
-            item.setCheckState(0, QtCore.Qt.Unchecked)
-            tree.addTopLevelItem(item)
+            item.setText(0, text)
+            if checked_flags is not None and checked_flags[index]:
+                item.setCheckState(0, QtCore.Qt.Checked)
+            else:
+                item.setCheckState(0, QtCore.Qt.Unchecked)
+            items.append(item)
+
+        self.tree.setUpdatesEnabled(False)
+        try:
+            self.tree.clear()
+            self.tree.addTopLevelItems(items)
+        finally:
+            self.tree.setUpdatesEnabled(True)
 
     def set_items_status(self, checked):
         """
@@ -344,16 +549,155 @@ class QCheckableList(QtWidgets.QWidget):
         Change the list of shown items
         :param new_items: (tuple) a new tuple os items to be shown
         """
-        root = self.tree.invisibleRootItem()
-        for item in root.takeChildren():
-            root.removeChild(item)
-
         self.items = new_items[:]
-        for i in self.items:
-            item = QtWidgets.QTreeWidgetItem()
-            item.setText(0, i)
-            item.setCheckState(0, QtCore.Qt.Unchecked)
-            self.tree.addTopLevelItem(item)
+        self._populate_tree(self.items)
+
+    def save_state(self):
+        """
+        Serialize items texts and check status into a compact binary blob.
+        Texts are stored length-prefixed, check status as a packed bitmap (one bit per item).
+        :return: (bytes) state to be passed to restore_state()
+        """
+        count = self.tree.topLevelItemCount()
+        encoded_texts = []
+        checked_bitmap = bytearray((count + 7) // 8)
+        for i in range(count):
+            item = self.tree.topLevelItem(i)
+            encoded_texts.append(item.text(0).encode("utf-8"))
+            if item.checkState(0):
+                checked_bitmap[i >> 3] |= 1 << (i & 7)
+        return (_CHECKABLE_LIST_STATE_HEADER.pack(b"PSCL", STATE_FORMAT_VERSION, count)
+                + struct.pack("<{}I".format(count), *[len(text) for text in encoded_texts])
+                + b"".join(encoded_texts)
+                + bytes(checked_bitmap))
+
+    def restore_state(self, state):
+        """
+        Restore a state produced by save_state(), rebuilding the whole list in one bulk pass
+        :param state: (bytes) the state blob
+        """
+        count, = _check_state_header(state, _CHECKABLE_LIST_STATE_HEADER, b"PSCL")
+        offset = _CHECKABLE_LIST_STATE_HEADER.size
+        try:
+            lengths = struct.unpack_from("<{}I".format(count), state, offset)
+        except struct.error:
+            raise ValueError("State blob is truncated")
+        offset += 4 * count
+        if len(state) < offset + sum(lengths) + (count + 7) // 8:
+            raise ValueError("State blob is truncated")
+
+        texts = []
+        for length in lengths:
+            texts.append(bytes(state[offset:offset + length]).decode("utf-8"))
+            offset += length
+        checked_bitmap = state[offset:offset + (count + 7) // 8]
+        checked_flags = [(checked_bitmap[i >> 3] >> (i & 7)) & 1 for i in range(count)]
+
+        self.items = tuple(texts)
+        self._populate_tree(self.items, checked_flags)
+
+
+class QUpdateFeeder(QtCore.QObject):
+    """
+    Thread-safe feeder used to push widget updates (like QCheckableList.update_items or
+    QTexturePalette.set_button_labels) from any thread.
+    Updates are queued into the GUI thread and only the latest pending one for each widget/operation pair is kept:
+    a coalescing timer applies them at most once per frame, so superseded updates never reach the UI.
+    The feeder must be created in the GUI thread.
+    """
+    updates_applied = Signal(int)  # Signal emitted after a flush, forwarding the number of updates applied
+    _updates_queued = Signal()  # Internal signal used to wake up the GUI thread
+
+    def __init__(self, frame_interval=16, parent=None):
+        """
+        Class constructor
+        :param frame_interval: (int) minimum time in milliseconds between two flushes of pending updates
+        :param parent: optional parent QObject
+        """
+        super(QUpdateFeeder, self).__init__(parent)
+
+        self._lock = threading.Lock()
+        self._pending_updates = {}  # (widget id, operation name) -> (widget, operation name, args)
+        self.dropped_count = 0  # Updates superseded by a newer one, targeting a deleted widget or failed
+        self.applied_count = 0  # Updates actually applied to the widgets
+
+        self._flush_timer = QtCore.QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(frame_interval)
+        self._flush_timer.timeout.connect(self._flush)
+        self._updates_queued.connect(self._schedule_flush)  # Queued connection when emitted from another thread
+
+    def feed(self, widget, operation, *args):
+        """
+        Queue a call to widget.operation(*args), replacing any pending call to the same operation of the same widget.
+        Can be called from any thread.
+        :param widget: the widget to be updated
+        :param operation: (str) name of the widget method to be called
+        :param args: arguments forwarded to the widget method
+        """
+        with self._lock:
+            key = (id(widget), operation)
+            if key in self._pending_updates:
+                self.dropped_count += 1
+            wake_up = not self._pending_updates
+            self._pending_updates[key] = (widget, operation, args)
+        if wake_up:
+            self._updates_queued.emit()
+
+    def update_items(self, checkable_list, new_items):
+        """
+        Queue a QCheckableList.update_items() call
+        :param checkable_list: (QCheckableList) the list to be updated
+        :param new_items: (tuple) the new items to be shown
+        """
+        self.feed(checkable_list, "update_items", tuple(new_items))
+
+    def set_button_labels(self, texture_palette, button_labels_filename):
+        """
+        Queue a QTexturePalette.set_button_labels() call
+        :param texture_palette: (QTexturePalette) the palette to be updated
+        :param button_labels_filename: full filename with path of the text file containing buttons' labels
+        """
+        self.feed(texture_palette, "set_button_labels", button_labels_filename)
+
+    def pending_count(self):
+        """
+        :return: (int) number of updates waiting to be applied
+        """
+        with self._lock:
+            return len(self._pending_updates)
+
+    @Slot()
+    def _schedule_flush(self):
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    @Slot()
+    def _flush(self):
+        """
+        Apply all the pending updates in the GUI thread
+        """
+        with self._lock:
+            pending_updates, self._pending_updates = self._pending_updates, {}
+
+        applied = dropped = 0
+        for widget, operation, args in pending_updates.values():
+            if not shiboken2.isValid(widget):  # The underlying C++ widget has already been deleted
+                dropped += 1
+                continue
+            try:
+                getattr(widget, operation)(*args)
+            except Exception:  # A failing update must not prevent the others from being applied
+                logging.getLogger(__name__).exception("Update '%s' of %r failed", operation, widget)
+                dropped += 1
+                continue
+            applied += 1
+
+        with self._lock:
+            self.applied_count += applied
+            self.dropped_count += dropped
+        if applied:
+            self.updates_applied.emit(applied)
 
 
 class QBrowseDialog(QtWidgets.QWidget):